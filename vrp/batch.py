@@ -0,0 +1,298 @@
+import contextlib
+import json
+import math
+import os
+import re
+import multiprocessing
+import time
+from multiprocessing.connection import wait
+from .solve_cvrp import solve_routing_problem, extract_solution_details
+
+# --- Instance Loading ---
+
+def parse_vrp_file(path, num_vehicles=None):
+    """Parses a TSPLIB/CVRPLIB .vrp file (EUC_2D) into the solver's data dict."""
+    header = {}
+    coords = {}
+    demands = {}
+    depots = []
+    section = None
+    with open(path) as f:
+        for raw_line in f:
+            line = raw_line.strip()
+            if not line or line == 'EOF': continue
+            if line.endswith('_SECTION'):
+                section = line
+                continue
+            if ':' in line and section is None:
+                key, value = line.split(':', 1)
+                header[key.strip()] = value.strip()
+                continue
+            parts = line.split()
+            if section == 'NODE_COORD_SECTION':
+                coords[int(parts[0])] = (float(parts[1]), float(parts[2]))
+            elif section == 'DEMAND_SECTION':
+                demands[int(parts[0])] = int(parts[1])
+            elif section == 'DEPOT_SECTION':
+                if int(parts[0]) != -1: depots.append(int(parts[0]))
+
+    if header.get('EDGE_WEIGHT_TYPE', 'EUC_2D') != 'EUC_2D':
+        raise ValueError(f"Unsupported EDGE_WEIGHT_TYPE: {header['EDGE_WEIGHT_TYPE']}")
+    node_ids = sorted(coords)
+    locations = [coords[n] for n in node_ids]
+    # Nodes missing from DEMAND_SECTION (e.g. the depot) have zero demand
+    demand_list = [demands.get(n, 0) for n in node_ids]
+    depot_id = depots[0] if depots else node_ids[0]
+
+    if num_vehicles is None:
+        # Augerat-style names encode the fleet size, e.g. P-n16-k8
+        match = re.search(r'-k(\d+)', header.get('NAME', ''))
+        if not match:
+            raise ValueError(f"Number of vehicles not found in {path}; pass it explicitly.")
+        num_vehicles = int(match.group(1))
+    capacity = int(header['CAPACITY'])
+
+    # TSPLIB EUC_2D distances are rounded to the nearest integer
+    distance_matrix = [[int(math.hypot(a[0] - b[0], a[1] - b[1]) + 0.5) for b in locations]
+                       for a in locations]
+    return {
+        'num_vehicles': num_vehicles,
+        'depot': node_ids.index(depot_id),
+        'vehicle_capacities': [capacity] * num_vehicles,
+        'locations': locations,
+        'demands': demand_list,
+        'distance_matrix': distance_matrix,
+    }
+
+def _normalize_instance(data, num_vehicles=None):
+    """Fills in defaults for a JSON instance so it matches the solver's data dict."""
+    if not isinstance(data, dict):
+        raise ValueError(f"Instance must be a JSON object, got {type(data).__name__}.")
+    if 'distance_matrix' not in data or 'demands' not in data:
+        raise ValueError("Instance needs at least 'distance_matrix' and 'demands'.")
+    data = dict(data)
+    data.setdefault('depot', 0)
+    if 'num_vehicles' not in data:
+        if 'vehicle_capacities' in data:
+            data['num_vehicles'] = len(data['vehicle_capacities'])
+        elif num_vehicles is not None:
+            data['num_vehicles'] = num_vehicles
+        else:
+            raise ValueError("Instance needs 'num_vehicles' or 'vehicle_capacities'.")
+    if 'vehicle_capacities' not in data:
+        data['vehicle_capacities'] = [data['capacity']] * data['num_vehicles']
+    # Coordinates are only needed for maps; batch results report node ids instead
+    data.setdefault('locations', [None] * len(data['distance_matrix']))
+    return data
+
+# Malformed files surface as any of these (bad JSON, missing keys, wrong value types)
+_LOAD_ERRORS = (OSError, ValueError, KeyError, TypeError, AttributeError, IndexError)
+
+SOURCE_FILE_TYPES = ('.jsonl', '.vrp', '.json')
+
+def _load_instance_file(path, num_vehicles=None):
+    if path.endswith('.vrp'):
+        return parse_vrp_file(path, num_vehicles)
+    with open(path) as f:
+        return _normalize_instance(json.load(f), num_vehicles)
+
+def iter_instances(source, num_vehicles=None):
+    """Yields (instance_id, data_or_error) for a directory of .json/.vrp files, a .jsonl file
+    (one instance per line) or a single .vrp/.json file.
+
+    Loading errors are yielded as Exception objects so one bad file doesn't stop a batch.
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in sorted(os.listdir(source))
+                 if name.endswith(('.vrp', '.json'))]
+    elif source.endswith('.jsonl'):
+        yield from _iter_jsonl(source, num_vehicles)
+        return
+    elif source.endswith(('.vrp', '.json')):
+        paths = [source]
+    else:
+        raise ValueError(f"Unsupported instance source {source}; expected a directory or {', '.join(SOURCE_FILE_TYPES)} file.")
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        try:
+            yield stem, _load_instance_file(path, num_vehicles)
+        except _LOAD_ERRORS as e:
+            yield stem, e
+
+def _iter_jsonl(source, num_vehicles=None):
+    with open(source) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip(): continue
+            instance_id = f"line-{line_number}"
+            try:
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    instance_id = str(record.get('id', record.get('name', instance_id)))
+                yield instance_id, _normalize_instance(record, num_vehicles)
+            except _LOAD_ERRORS as e:
+                yield instance_id, e
+
+# --- Checkpointing ---
+
+def load_checkpoint(output_path, retry_failed=False):
+    """Returns the instance ids already recorded in output_path.
+
+    A trailing partial line (from a crash mid-write) is ignored and will be re-solved.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if retry_failed and record.get('status') != 'success':
+                continue
+            done.add(record['instance_id'])
+    return done
+
+def _open_checkpoint(output_path):
+    """Opens output_path for appending, terminating any partial last line first."""
+    out = open(output_path, 'a+')
+    if out.tell() > 0:
+        out.seek(out.tell() - 1)
+        if out.read(1) != '\n':
+            out.write('\n')
+    return out
+
+def _write_record(out, record):
+    out.write(json.dumps(record) + '\n')
+    out.flush()
+    os.fsync(out.fileno())
+
+# --- Worker ---
+
+def solve_instance(instance_id, data, time_limit_seconds=None, metaheuristic=None):
+    """Solves a single instance; runs inside a worker process and never raises."""
+    start = time.perf_counter()
+    record = {'instance_id': instance_id}
+    try:
+        # The solver's progress banners would drown out the batch log across thousands of runs
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            solution, manager, routing = solve_routing_problem(data, time_limit_seconds, metaheuristic)
+            results = extract_solution_details(data, manager, routing, solution) if solution else None
+        if results is None:
+            record.update({'status': 'error', 'message': 'Solver failed to find a solution'})
+        else:
+            results.pop('routes', None)  # coordinates; route_details already has the node ids
+            record.update(results)
+    except Exception as e:
+        record.update({'status': 'error', 'message': f"{type(e).__name__}: {e}"})
+    record['solve_seconds'] = round(time.perf_counter() - start, 3)
+    return record
+
+# --- Batch Orchestrator ---
+
+_POLL_SECONDS = 1
+
+def _error_record(instance_id, message, started=None):
+    solve_seconds = round(time.perf_counter() - started, 3) if started else 0
+    return {'instance_id': instance_id, 'status': 'error', 'message': message,
+            'solve_seconds': solve_seconds}
+
+def _solve_in_child(conn, instance_id, data, time_limit_seconds, metaheuristic):
+    conn.send(solve_instance(instance_id, data, time_limit_seconds, metaheuristic))
+    conn.close()
+
+def run_batch(source, output_path, workers=None, time_limit_seconds=30, metaheuristic=None,
+              wall_timeout_seconds=None, num_vehicles=None, retry_failed=False, log=print):
+    """Solves every instance in source in parallel, appending results to output_path.
+
+    Results are written as soon as each instance finishes, so a rerun with the same
+    output_path skips everything already recorded and resumes where it stopped.
+
+    Each instance runs in its own process, at most `workers` at a time. A process that dies
+    (OOM, native crash) only fails its own instance, and one still busy after
+    wall_timeout_seconds (default: twice the time limit plus a minute) is killed and its
+    instance recorded as timed out.
+    """
+    workers = workers or os.cpu_count() or 1
+    if metaheuristic and not time_limit_seconds:
+        raise ValueError("A metaheuristic never stops on its own; it needs a positive time limit.")
+    if wall_timeout_seconds is None and time_limit_seconds:
+        wall_timeout_seconds = 2 * time_limit_seconds + 60
+    done = load_checkpoint(output_path, retry_failed)
+    if done:
+        log(f"Resuming: {len(done)} instances already in {output_path}")
+    counts = {'success': 0, 'error': 0, 'skipped': 0}
+    running = {}  # result pipe -> (instance_id, process, started)
+
+    def record_result(record):
+        _write_record(out, record)
+        status = 'success' if record.get('status') == 'success' else 'error'
+        counts[status] += 1
+        log(f"[{record['instance_id']}] {record.get('status')} "
+            f"({record.get('objective_distance_meters', record.get('message'))}, {record['solve_seconds']}s)")
+
+    def next_instance():
+        for instance_id, data in instances:
+            if instance_id in done:
+                counts['skipped'] += 1
+                continue
+            done.add(instance_id)  # also skips duplicate ids later in the same source
+            if isinstance(data, Exception):
+                record_result(_error_record(instance_id, f"Failed to load instance: {data}"))
+                continue
+            return instance_id, data
+        return None
+
+    def finish(conn):
+        instance_id, process, started = running.pop(conn)
+        try:
+            record = conn.recv()
+        except (EOFError, OSError):
+            # The process exited without sending a (complete) result
+            process.join()
+            record = _error_record(
+                instance_id, f"Worker process died while solving this instance (exit code {process.exitcode})", started)
+        conn.close()
+        process.join()
+        record_result(record)
+
+    instances = iter_instances(source, num_vehicles)
+    try:
+        with _open_checkpoint(output_path) as out:
+            exhausted = False
+            while True:
+                while not exhausted and len(running) < workers:
+                    item = next_instance()
+                    if item is None:
+                        exhausted = True
+                        break
+                    instance_id, data = item
+                    reader, writer = multiprocessing.Pipe(duplex=False)
+                    process = multiprocessing.Process(
+                        target=_solve_in_child, daemon=True,
+                        args=(writer, instance_id, data, time_limit_seconds, metaheuristic))
+                    process.start()
+                    writer.close()
+                    running[reader] = (instance_id, process, time.perf_counter())
+                if not running:
+                    break
+
+                # A pipe becomes ready when its process sends a result or exits without one
+                for conn in wait(list(running), timeout=_POLL_SECONDS if wall_timeout_seconds else None):
+                    finish(conn)
+
+                now = time.perf_counter()
+                for conn, (instance_id, process, started) in list(running.items()):
+                    if wall_timeout_seconds and now - started > wall_timeout_seconds:
+                        process.kill()
+                        process.join()
+                        conn.close()
+                        del running[conn]
+                        record_result(_error_record(
+                            instance_id, f"Timed out after {wall_timeout_seconds}s wall clock", started))
+    finally:
+        for conn, (_, process, _) in running.items():
+            process.kill()
+            process.join()
+            conn.close()
+    return counts
@@ -0,0 +1,54 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from vrp.batch import SOURCE_FILE_TYPES, run_batch
+
+METAHEURISTICS = ['AUTOMATIC', 'GREEDY_DESCENT', 'GUIDED_LOCAL_SEARCH', 'SIMULATED_ANNEALING', 'TABU_SEARCH']
+
+class Command(BaseCommand):
+    help = ("Solves a directory of .vrp/.json instances (or a .jsonl file) in parallel, "
+            "writing results incrementally to a JSONL file and resuming from it on rerun.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="Directory of .vrp/.json instances, a .jsonl file (one instance per line) "
+                                           "or a single .vrp/.json file.")
+        parser.add_argument('output', help="JSONL results file; existing entries are skipped on rerun.")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores).")
+        parser.add_argument('--time-limit', type=int, default=30,
+                            help="Per-instance cap on solver search time in seconds (0 for none; must be positive with "
+                                 "--metaheuristic). The default search usually stops earlier; with --metaheuristic "
+                                 "every instance uses all of it.")
+        parser.add_argument('--metaheuristic', default=None, choices=METAHEURISTICS,
+                            help="OR-Tools local search metaheuristic to keep improving until the time limit.")
+        parser.add_argument('--wall-timeout', type=int, default=None,
+                            help="Kill a worker busy on one instance longer than this many seconds "
+                                 "(default: twice the time limit plus 60).")
+        parser.add_argument('--num-vehicles', type=int, default=None,
+                            help="Fleet size for instances that don't specify one.")
+        parser.add_argument('--retry-failed', action='store_true',
+                            help="Re-solve instances previously recorded with an error.")
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['source']):
+            raise CommandError(f"Instance source not found: {options['source']}")
+        if not os.path.isdir(options['source']) and not options['source'].endswith(SOURCE_FILE_TYPES):
+            raise CommandError(f"Instance source must be a directory or a {', '.join(SOURCE_FILE_TYPES)} file.")
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError("--workers must be at least 1.")
+        if options['metaheuristic'] and options['time_limit'] <= 0:
+            # Metaheuristics only stop at the time limit, so without one every solve runs forever
+            raise CommandError("--metaheuristic needs a positive --time-limit.")
+
+        counts = run_batch(
+            source=options['source'],
+            output_path=options['output'],
+            workers=options['workers'],
+            time_limit_seconds=options['time_limit'],
+            metaheuristic=options['metaheuristic'],
+            wall_timeout_seconds=options['wall_timeout'],
+            num_vehicles=options['num_vehicles'],
+            retry_failed=options['retry_failed'],
+            log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Batch finished: {counts['success']} solved, {counts['error']} failed, "
+            f"{counts['skipped']} already done."))
@@ -0,0 +1,91 @@
+import numpy as np
+
+def read_routes(manager, routing, solution, num_vehicles):
+    """Pulls every next-pointer and node id out of the solution once, then walks them locally.
+
+    Returns one list of node indices per vehicle, each starting and ending at the depot.
+    """
+    size = routing.Size()
+    # Indices >= size are the per-vehicle end nodes, which have no successor. routing.Next
+    # skips building a NextVar proxy per index; plain lists suit the element-wise walk below.
+    next_index = [routing.Next(solution, i) for i in range(size)]
+    index_to_node = [manager.IndexToNode(i) for i in range(size + num_vehicles)]
+    routes = []
+    for vehicle_id in range(num_vehicles):
+        index = routing.Start(vehicle_id)
+        route = [index_to_node[index]]
+        while index < size:
+            index = next_index[index]
+            route.append(index_to_node[index])
+        routes.append(route)
+    return routes
+
+def compute_route_analytics(data, routes):
+    """Computes per-route and fleet-wide statistics with NumPy against data['distance_matrix']
+    (a list of lists or a 2-D array).
+
+    Per-vehicle stats are returned column-wise (one list per metric, indexed by vehicle_id).
+    A vehicle counts as used when it makes at least one stop.
+    """
+    matrix = data['distance_matrix']
+    demands = np.asarray(data['demands'])
+    capacities = np.asarray(data['vehicle_capacities'], dtype=float)
+    num_vehicles = len(routes)
+
+    # Flatten all routes into one arc list tagged by vehicle, then reduce per vehicle
+    lengths = np.fromiter((len(r) for r in routes), dtype=np.int64, count=num_vehicles)
+    nodes = np.fromiter((n for r in routes for n in r), dtype=np.int64, count=int(lengths.sum()))
+    node_vehicle = np.repeat(np.arange(num_vehicles), lengths)
+    same_route = node_vehicle[:-1] == node_vehicle[1:]
+    arc_from, arc_to = nodes[:-1][same_route], nodes[1:][same_route]
+    arc_vehicle = node_vehicle[:-1][same_route]
+    # Look up only the arcs driven; converting the whole n x n matrix would cost O(n^2) per call
+    if isinstance(matrix, np.ndarray):
+        legs = matrix[arc_from, arc_to]
+    else:
+        legs = np.fromiter((matrix[a][b] for a, b in zip(arc_from.tolist(), arc_to.tolist())),
+                           dtype=float, count=len(arc_from))
+
+    distance = np.bincount(arc_vehicle, weights=legs, minlength=num_vehicles)
+    # Each route ends back at the depot; count its demand once, as the Capacity dimension does
+    route_end = np.zeros(len(nodes), dtype=bool)
+    route_end[np.cumsum(lengths) - 1] = True
+    load = np.bincount(node_vehicle[~route_end], weights=demands[nodes[~route_end]],
+                       minlength=num_vehicles)
+    longest_leg = np.zeros(num_vehicles)
+    np.maximum.at(longest_leg, arc_vehicle, legs)
+    stops = lengths - 2  # exclude depot start and end
+    utilization = np.divide(load, capacities, out=np.zeros(num_vehicles), where=capacities > 0)
+
+    used = stops > 0
+    used_distance = distance[used]
+    used_utilization = utilization[used]
+    if used.any():
+        mean_distance = used_distance.mean()
+        fleet = {
+            'vehicles_used': int(used.sum()),
+            'mean_distance_meters': float(mean_distance),
+            'distance_std_meters': float(used_distance.std()),
+            # Coefficient of variation: 0 means every used vehicle drives the same distance
+            'distance_cv': float(used_distance.std() / mean_distance) if mean_distance > 0 else 0.0,
+            'max_to_min_distance_ratio': float(used_distance.max() / used_distance.min())
+                                         if used_distance.min() > 0 else None,
+            'mean_utilization': float(used_utilization.mean()),
+            'min_utilization': float(used_utilization.min()),
+            'max_utilization': float(used_utilization.max()),
+            'longest_leg_meters': int(longest_leg.max()),
+        }
+    else:
+        fleet = {'vehicles_used': 0}
+
+    return {
+        'per_vehicle': {
+            'vehicle_id': list(range(num_vehicles)),
+            'stops': stops.tolist(),
+            'distance_meters': distance.astype(np.int64).tolist(),
+            'load': load.astype(np.int64).tolist(),
+            'utilization': np.round(utilization, 4).tolist(),
+            'longest_leg_meters': longest_leg.astype(np.int64).tolist(),
+        },
+        'fleet': fleet,
+    }
@@ -6,6 +6,7 @@ from ortools.constraint_solver import routing_enums_pb2
 from ortools.constraint_solver import pywrapcp
 from dotenv import load_dotenv
 from .generate_data import generate_synthetic_data
+from .route_analytics import read_routes, compute_route_analytics
 
 def compute_ors_distance_matrix(locations, api_key):
     """Creates a distance matrix using OpenRouteService API."""
@@ -36,7 +37,7 @@ def compute_ors_distance_matrix(locations, api_key):
         return None
 
 # --- Helper Function: Visualization ---
-def visualize_solution_map(data, manager, routing, solution, filename="vellore_routes.html"):
+def visualize_solution_map(data, route_details, filename="vellore_routes.html"):
     """Saves a Folium map visualization of the routes to an HTML file."""
     print("\nGenerating map visualization...")
     locations = data['locations']
@@ -61,15 +62,9 @@ def visualize_solution_map(data, manager, routing, solution, filename="vellore_r
     # Route lines
     colors = ['green', 'purple', 'orange', 'darkred', 'lightred', 'beige', 'darkblue', 'darkgreen',
               'cadetblue', 'darkpurple', 'pink', 'lightblue', 'lightgreen', 'gray', 'black', 'lightgray']
-    for vehicle_id in range(data['num_vehicles']):
-        index = routing.Start(vehicle_id)
-        route_coords = []
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            route_coords.append(locations[node_index])
-            index = solution.Value(routing.NextVar(index))
-        node_index = manager.IndexToNode(index)
-        route_coords.append(locations[node_index])
+    for route in route_details:
+        vehicle_id = route['vehicle_id']
+        route_coords = [locations[node_index] for node_index in route['nodes_visited']]
         if len(route_coords) > 2:
             folium.PolyLine(
                 route_coords, color=colors[vehicle_id % len(colors)], weight=3,
@@ -122,8 +117,13 @@ def prepare_data(api_key, center_lat, center_lon, num_customers=25, num_vehicles
     print("--- Data Preparation Complete ---")
     return data
 
-def solve_routing_problem(data):
-    """Sets up and solves the CVRP using OR-Tools."""
+def solve_routing_problem(data, time_limit_seconds=None, metaheuristic=None):
+    """Sets up and solves the CVRP using OR-Tools.
+
+    time_limit_seconds caps the search; the default search usually stops well before it.
+    metaheuristic names a LocalSearchMetaheuristic (e.g. 'GUIDED_LOCAL_SEARCH'); those keep
+    improving until the time limit, so with one set every solve uses its full budget.
+    """
     if not data: return None, None, None
     print("--- Solving Routing Problem ---")
     # 1. Setup Routing Model
@@ -159,7 +159,11 @@ def solve_routing_problem(data):
     search_parameters = pywrapcp.DefaultRoutingSearchParameters()
     search_parameters.first_solution_strategy = (
         routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-    # search_parameters.time_limit.SetSeconds(30)
+    if metaheuristic:
+        search_parameters.local_search_metaheuristic = (
+            getattr(routing_enums_pb2.LocalSearchMetaheuristic, metaheuristic))
+    if time_limit_seconds:
+        search_parameters.time_limit.FromSeconds(int(time_limit_seconds))
 
     # 5. Solve
     print("Running OR-Tools solver...")
@@ -172,39 +176,28 @@ def solve_routing_problem(data):
         return None, None, None
 
 def extract_solution_details(data, manager, routing, solution):
-    """Extracts key details from the OR-Tools solution object."""
-    # (No changes needed in this function's logic)
+    """Extracts key details and route analytics from the OR-Tools solution object."""
     if not solution: return None
     print("--- Extracting Solution Details ---")
+    routes = read_routes(manager, routing, solution, data['num_vehicles'])
+    analytics = compute_route_analytics(data, routes)
+    per_vehicle = analytics['per_vehicle']
     output = {
         'status': 'success', 'objective_distance_meters': solution.ObjectiveValue(),
-        'total_load_delivered': 0, 'routes': [], 'route_details': []
+        'total_load_delivered': 0, 'routes': [], 'route_details': [], 'analytics': analytics
     }
     total_load = 0
-    for vehicle_id in range(data['num_vehicles']):
-        index = routing.Start(vehicle_id)
-        route_coords = []
-        route_nodes = []
-        route_load = 0
-        route_distance = 0
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            route_nodes.append(node_index)
-            route_coords.append(data['locations'][node_index])
-            route_load += data['demands'][node_index]
-            previous_index = index
-            index = solution.Value(routing.NextVar(index))
-            if previous_index is not None and index is not None:
-                 arc_cost = routing.GetArcCostForVehicle(previous_index, index, vehicle_id)
-                 if arc_cost is not None: route_distance += arc_cost
-        node_index = manager.IndexToNode(index)
-        route_nodes.append(node_index)
-        route_coords.append(data['locations'][node_index])
-        if route_distance > 0:
-            output['routes'].append(route_coords)
+    for vehicle_id, route_nodes in enumerate(routes):
+        route_distance = per_vehicle['distance_meters'][vehicle_id]
+        route_load = per_vehicle['load'][vehicle_id]
+        if per_vehicle['stops'][vehicle_id] > 0:
+            output['routes'].append([data['locations'][node] for node in route_nodes])
             output['route_details'].append({
                 'vehicle_id': vehicle_id, 'nodes_visited': route_nodes,
-                'distance_meters': route_distance, 'load': route_load
+                'distance_meters': route_distance, 'load': route_load,
+                'stops': per_vehicle['stops'][vehicle_id],
+                'utilization': per_vehicle['utilization'][vehicle_id],
+                'longest_leg_meters': per_vehicle['longest_leg_meters'][vehicle_id]
             })
             total_load += route_load
     output['total_load_delivered'] = total_load
@@ -266,7 +259,7 @@ def run_vellore_solver(api_key=None, center_lat=None, center_lon=None, num_custo
     map_file = None
     if visualize:
         # Pass a unique filename if needed, maybe based on timestamp or params
-        map_file = visualize_solution_map(data, manager, routing, solution)
+        map_file = visualize_solution_map(data, results['route_details'])
     results['map_html_file'] = map_file
 
     print("--- CVRP Solver Finished Successfully ---")
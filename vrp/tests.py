@@ -1,3 +1,355 @@
-from django.test import TestCase
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+from ortools.constraint_solver import pywrapcp
+from . import batch
+from .route_analytics import compute_route_analytics, read_routes
+from .solve_cvrp import solve_routing_problem, extract_solution_details
 
-# Create your tests here.
+VRP_FILE = Path(__file__).resolve().parent.parent / 'P-n16-k8.vrp'
+
+def _tiny_instance(**overrides):
+    instance = {
+        'distance_matrix': [[0, 3, 4], [3, 0, 2], [4, 2, 0]],
+        'demands': [0, 2, 3],
+        'num_vehicles': 1,
+        'capacity': 10,
+    }
+    instance.update(overrides)
+    return instance
+
+# Stand-ins for solve_instance, module-level so worker processes can unpickle them
+_real_solve_instance = batch.solve_instance
+
+def _crash_on_boom(instance_id, data, time_limit_seconds=None, metaheuristic=None):
+    if instance_id == 'boom':
+        os._exit(1)
+    return _real_solve_instance(instance_id, data, time_limit_seconds, metaheuristic)
+
+def _hang_on_slow(instance_id, data, time_limit_seconds=None, metaheuristic=None):
+    if instance_id == 'slow':
+        time.sleep(60)
+    return _real_solve_instance(instance_id, data, time_limit_seconds, metaheuristic)
+
+
+class ParseVrpFileTests(SimpleTestCase):
+    def test_parses_augerat_instance(self):
+        data = batch.parse_vrp_file(VRP_FILE)
+        self.assertEqual(data['num_vehicles'], 8)
+        self.assertEqual(data['depot'], 0)
+        self.assertEqual(data['vehicle_capacities'], [35] * 8)
+        self.assertEqual(len(data['distance_matrix']), 16)
+        self.assertEqual(data['demands'][:3], [0, 19, 30])
+        # Nodes 1 (30, 40) and 2 (37, 52): sqrt(49 + 144) = 13.89 -> 14
+        self.assertEqual(data['distance_matrix'][0][1], 14)
+
+    def test_explicit_num_vehicles_overrides_name(self):
+        self.assertEqual(batch.parse_vrp_file(VRP_FILE, num_vehicles=3)['num_vehicles'], 3)
+
+
+class IterInstancesTests(SimpleTestCase):
+    def test_bad_jsonl_lines_are_yielded_as_errors(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'instances.jsonl')
+            with open(source, 'w') as f:
+                f.write(json.dumps(_tiny_instance(id='a')) + '\n')
+                f.write('[1, 2]\n')
+                f.write(json.dumps(_tiny_instance(id='c', num_vehicles='two')) + '\n')
+                f.write('{not json\n')
+            loaded = dict(batch.iter_instances(source))
+        self.assertEqual(loaded['a']['vehicle_capacities'], [10])
+        self.assertIsInstance(loaded['line-2'], ValueError)
+        self.assertIsInstance(loaded['c'], TypeError)
+        self.assertIsInstance(loaded['line-4'], ValueError)
+
+    def test_directory_skips_other_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            Path(tmp, 'P-n16-k8.vrp').write_text(VRP_FILE.read_text())
+            Path(tmp, 'tiny.json').write_text(json.dumps(_tiny_instance()))
+            Path(tmp, 'notes.txt').write_text('ignored')
+            Path(tmp, 'scalar.json').write_text('3')
+            loaded = dict(batch.iter_instances(tmp))
+        self.assertEqual(sorted(loaded), ['P-n16-k8', 'scalar', 'tiny'])
+        self.assertIsInstance(loaded['scalar'], ValueError)
+
+    def test_single_vrp_and_json_files(self):
+        self.assertEqual([instance_id for instance_id, _ in batch.iter_instances(str(VRP_FILE))], ['P-n16-k8'])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'tiny.json')
+            Path(path).write_text(json.dumps(_tiny_instance(), indent=2))
+            [(instance_id, data)] = batch.iter_instances(path)
+        self.assertEqual(instance_id, 'tiny')
+        self.assertEqual(data['num_vehicles'], 1)
+
+    def test_unsupported_source_raises(self):
+        with self.assertRaises(ValueError):
+            list(batch.iter_instances('instances.txt'))
+
+
+class CheckpointTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output = os.path.join(self.tmp.name, 'out.jsonl')
+        with open(self.output, 'w') as f:
+            f.write('{"instance_id": "a", "status": "success"}\n')
+            f.write('{"instance_id": "b", "status": "error"}\n')
+            f.write('{"instance_id": "b", "status": "success"}\n')
+            f.write('{"instance_id": "c", "status": "error"}\n')
+            f.write('{"instance_id": "d", "sta')
+
+    def test_partial_last_line_is_ignored(self):
+        self.assertEqual(batch.load_checkpoint(self.output), {'a', 'b', 'c'})
+
+    def test_retry_failed_keeps_later_successes(self):
+        self.assertEqual(batch.load_checkpoint(self.output, retry_failed=True), {'a', 'b'})
+
+    def test_append_starts_on_a_fresh_line(self):
+        with batch._open_checkpoint(self.output) as out:
+            batch._write_record(out, {'instance_id': 'e', 'status': 'success'})
+        self.assertEqual(batch.load_checkpoint(self.output), {'a', 'b', 'c', 'e'})
+
+
+class SolveInstanceTests(SimpleTestCase):
+    def test_solves_vrp_file_with_time_limit(self):
+        record = batch.solve_instance('P-n16-k8', batch.parse_vrp_file(VRP_FILE), time_limit_seconds=1)
+        self.assertEqual(record['status'], 'success', record.get('message'))
+        self.assertEqual(record['total_load_delivered'], 246)
+        self.assertNotIn('routes', record)
+
+    def test_solves_with_metaheuristic(self):
+        record = batch.solve_instance('P-n16-k8', batch.parse_vrp_file(VRP_FILE), time_limit_seconds=1,
+                                      metaheuristic='GUIDED_LOCAL_SEARCH')
+        self.assertEqual(record['status'], 'success', record.get('message'))
+
+
+class RunBatchTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.source = os.path.join(self.tmp.name, 'instances.jsonl')
+        self.output = os.path.join(self.tmp.name, 'out.jsonl')
+
+    def write_source(self, *lines):
+        with open(self.source, 'w') as f:
+            for line in lines:
+                f.write((line if isinstance(line, str) else json.dumps(line)) + '\n')
+
+    def read_output(self):
+        with open(self.output) as f:
+            return {record['instance_id']: record for record in map(json.loads, f)}
+
+    def run_batch(self, **kwargs):
+        kwargs.setdefault('workers', 2)
+        kwargs.setdefault('time_limit_seconds', 1)
+        return batch.run_batch(self.source, self.output, log=lambda message: None, **kwargs)
+
+    def test_writes_results_and_resumes(self):
+        self.write_source(_tiny_instance(id='a'), '[1, 2]', _tiny_instance(id='a'), _tiny_instance(id='b'))
+        counts = self.run_batch()
+        # The repeated 'a' is skipped rather than written twice
+        self.assertEqual(counts, {'success': 2, 'error': 1, 'skipped': 1})
+        records = self.read_output()
+        self.assertEqual(records['a']['objective_distance_meters'], 9)
+        self.assertEqual(records['line-2']['status'], 'error')
+
+        counts = self.run_batch()
+        self.assertEqual(counts, {'success': 0, 'error': 0, 'skipped': 4})
+        counts = self.run_batch(retry_failed=True)
+        self.assertEqual(counts, {'success': 0, 'error': 1, 'skipped': 3})
+
+    def test_dead_worker_only_fails_its_own_instance(self):
+        self.write_source(_tiny_instance(id='a'), _tiny_instance(id='boom'), _tiny_instance(id='b'),
+                          _tiny_instance(id='c'))
+        with mock.patch.object(batch, 'solve_instance', _crash_on_boom):
+            counts = self.run_batch()
+        self.assertEqual(counts, {'success': 3, 'error': 1, 'skipped': 0})
+        records = self.read_output()
+        self.assertIn('Worker process died', records['boom']['message'])
+        self.assertEqual(records['c']['status'], 'success')
+
+    def test_wall_timeout_kills_stuck_worker(self):
+        self.write_source(_tiny_instance(id='slow'), _tiny_instance(id='a'), _tiny_instance(id='b'))
+        with mock.patch.object(batch, 'solve_instance', _hang_on_slow):
+            counts = self.run_batch(wall_timeout_seconds=1)
+        self.assertEqual(counts, {'success': 2, 'error': 1, 'skipped': 0})
+        self.assertIn('Timed out', self.read_output()['slow']['message'])
+
+    def test_metaheuristic_requires_time_limit(self):
+        self.write_source(_tiny_instance(id='a'))
+        with self.assertRaises(ValueError):
+            self.run_batch(time_limit_seconds=0, metaheuristic='GUIDED_LOCAL_SEARCH')
+
+
+class SolveBatchCommandTests(SimpleTestCase):
+    def test_rejects_metaheuristic_without_time_limit(self):
+        with self.assertRaisesMessage(CommandError, 'positive --time-limit'):
+            call_command('solve_batch', str(VRP_FILE), os.devnull, time_limit=0,
+                         metaheuristic='GUIDED_LOCAL_SEARCH')
+
+    def test_rejects_unsupported_source_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.txt') as source:
+            with self.assertRaisesMessage(CommandError, 'must be a directory'):
+                call_command('solve_batch', source.name, os.devnull)
+
+    def test_solves_single_vrp_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'out.jsonl')
+            call_command('solve_batch', str(VRP_FILE), output, time_limit=1, stdout=io.StringIO())
+            with open(output) as f:
+                [record] = map(json.loads, f)
+        self.assertEqual(record['instance_id'], 'P-n16-k8')
+        self.assertEqual(record['status'], 'success')
+
+
+class RouteAnalyticsTests(SimpleTestCase):
+    def setUp(self):
+        self.data = {
+            'distance_matrix': [[0, 3, 4, 5, 6],
+                                [3, 0, 2, 7, 7],
+                                [4, 2, 0, 7, 7],
+                                [5, 7, 7, 0, 1],
+                                [6, 7, 7, 1, 0]],
+            'demands': [1, 2, 3, 4, 5],
+            'vehicle_capacities': [10, 10, 10],
+        }
+
+    def test_per_vehicle_and_fleet_stats(self):
+        analytics = compute_route_analytics(self.data, [[0, 1, 2, 0], [0, 3, 4, 0], [0, 0]])
+        per_vehicle, fleet = analytics['per_vehicle'], analytics['fleet']
+        self.assertEqual(per_vehicle['stops'], [2, 2, 0])
+        self.assertEqual(per_vehicle['distance_meters'], [9, 12, 0])  # 3+2+4, 5+1+6
+        self.assertEqual(per_vehicle['load'], [6, 10, 1])  # depot demand counted once
+        self.assertEqual(per_vehicle['utilization'], [0.6, 1.0, 0.1])
+        self.assertEqual(per_vehicle['longest_leg_meters'], [4, 6, 0])
+        self.assertEqual(fleet['vehicles_used'], 2)
+        self.assertEqual(fleet['mean_distance_meters'], 10.5)
+        self.assertEqual(fleet['distance_std_meters'], 1.5)
+        self.assertAlmostEqual(fleet['distance_cv'], 1.5 / 10.5)
+        self.assertAlmostEqual(fleet['max_to_min_distance_ratio'], 12 / 9)
+        self.assertAlmostEqual(fleet['mean_utilization'], 0.8)
+        self.assertEqual((fleet['min_utilization'], fleet['max_utilization']), (0.6, 1.0))
+        self.assertEqual(fleet['longest_leg_meters'], 6)
+
+    def test_no_used_vehicles(self):
+        analytics = compute_route_analytics(self.data, [[0, 0], [0, 0], [0, 0]])
+        self.assertEqual(analytics['fleet'], {'vehicles_used': 0})
+        self.assertEqual(analytics['per_vehicle']['distance_meters'], [0, 0, 0])
+
+    def test_single_vehicle(self):
+        data = dict(self.data, vehicle_capacities=[20])
+        fleet = compute_route_analytics(data, [[0, 1, 2, 3, 4, 0]])['fleet']
+        self.assertEqual(fleet['vehicles_used'], 1)
+        self.assertEqual(fleet['mean_distance_meters'], 19)  # 3+2+7+1+6
+        self.assertEqual(fleet['distance_cv'], 0.0)
+        self.assertEqual(fleet['max_to_min_distance_ratio'], 1.0)
+
+    def test_zero_distance_route_and_zero_capacity(self):
+        # A customer sharing the depot's location still counts as a used vehicle
+        data = dict(self.data, vehicle_capacities=[10, 0])
+        data['distance_matrix'] = [row[:] for row in self.data['distance_matrix']]
+        data['distance_matrix'][0][1] = data['distance_matrix'][1][0] = 0
+        analytics = compute_route_analytics(data, [[0, 1, 0], [0, 3, 0]])
+        self.assertEqual(analytics['per_vehicle']['distance_meters'], [0, 10])
+        self.assertEqual(analytics['per_vehicle']['utilization'], [0.3, 0.0])
+        self.assertEqual(analytics['fleet']['vehicles_used'], 2)
+        self.assertIsNone(analytics['fleet']['max_to_min_distance_ratio'])
+
+    def test_load_matches_capacity_dimension(self):
+        data = batch.parse_vrp_file(VRP_FILE)
+        data['demands'][data['depot']] = 2
+        with contextlib.redirect_stdout(io.StringIO()):
+            solution, manager, routing = solve_routing_problem(data, time_limit_seconds=1)
+            results = extract_solution_details(data, manager, routing, solution)
+        capacity = routing.GetDimensionOrDie('Capacity')
+        for route in results['route_details']:
+            end_cumul = solution.Value(capacity.CumulVar(routing.End(route['vehicle_id'])))
+            self.assertEqual(route['load'], end_cumul)
+        self.assertEqual(len(results['route_details']), results['analytics']['fleet']['vehicles_used'])
+
+
+def _per_arc_walk(data, manager, routing, solution):
+    """The pre-analytics extraction loop: several OR-Tools calls per arc."""
+    stats = []
+    for vehicle_id in range(data['num_vehicles']):
+        index = routing.Start(vehicle_id)
+        route_load = route_distance = 0
+        while not routing.IsEnd(index):
+            route_load += data['demands'][manager.IndexToNode(index)]
+            previous_index = index
+            index = solution.Value(routing.NextVar(index))
+            route_distance += routing.GetArcCostForVehicle(previous_index, index, vehicle_id)
+        stats.append((route_distance, route_load))
+    return stats
+
+
+class RouteAnalyticsScalingTests(SimpleTestCase):
+    """Extraction on an 800-node, 60-vehicle solution must not be slower than the per-arc walk."""
+
+    def setUp(self):
+        rng = random.Random(7)
+        num_nodes, num_vehicles = 800, 60
+        matrix = [[rng.randint(1, 5000) for _ in range(num_nodes)] for _ in range(num_nodes)]
+        self.data = {
+            'distance_matrix': matrix,
+            'demands': [0] + [rng.randint(1, 9) for _ in range(num_nodes - 1)],
+            'num_vehicles': num_vehicles,
+            'vehicle_capacities': [200] * num_vehicles,
+        }
+        customers = list(range(1, num_nodes))
+        rng.shuffle(customers)
+        self.routes = [[0] + customers[v::num_vehicles] + [0] for v in range(num_vehicles)]
+
+        # Build the assignment from known routes rather than solving, which would take seconds
+        self.manager = manager = pywrapcp.RoutingIndexManager(num_nodes, num_vehicles, 0)
+        self.routing = pywrapcp.RoutingModel(manager)
+        transit = self.routing.RegisterTransitCallback(
+            lambda a, b: matrix[manager.IndexToNode(a)][manager.IndexToNode(b)])
+        self.routing.SetArcCostEvaluatorOfAllVehicles(transit)
+        self.routing.CloseModel()
+        self.solution = self.routing.ReadAssignmentFromRoutes(
+            [[manager.NodeToIndex(node) for node in route[1:-1]] for route in self.routes], True)
+
+    def extract(self):
+        routes = read_routes(self.manager, self.routing, self.solution, self.data['num_vehicles'])
+        return compute_route_analytics(self.data, routes)
+
+    def test_matches_per_arc_walk(self):
+        self.assertEqual(read_routes(self.manager, self.routing, self.solution, self.data['num_vehicles']),
+                         self.routes)
+        per_vehicle = self.extract()['per_vehicle']
+        self.assertEqual(list(zip(per_vehicle['distance_meters'], per_vehicle['load'])),
+                         _per_arc_walk(self.data, self.manager, self.routing, self.solution))
+
+    def test_not_slower_than_per_arc_walk(self):
+        def best_of(fn, repeats=5):
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+        old = best_of(lambda: _per_arc_walk(self.data, self.manager, self.routing, self.solution))
+        new = best_of(self.extract)
+        self.assertLessEqual(new, old, f"extraction took {new * 1000:.2f} ms vs {old * 1000:.2f} ms per-arc walk")
+
+    def test_matrix_is_not_converted_whole(self):
+        rows_read = []
+
+        class Row(list):
+            def __getitem__(self, key):
+                rows_read.append(key)
+                return super().__getitem__(key)
+
+        data = dict(self.data, distance_matrix=[Row(row) for row in self.data['distance_matrix']])
+        compute_route_analytics(data, self.routes)
+        # One lookup per driven arc, not one per matrix cell
+        self.assertEqual(len(rows_read), sum(len(route) - 1 for route in self.routes))